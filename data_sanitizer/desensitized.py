@@ -1,31 +1,50 @@
 import os
+import gc
 import json
 import logging
-import math
-from sqlalchemy import create_engine, inspect, Table, MetaData
+import multiprocessing
+import multiprocessing.pool
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, inspect, MetaData
 from sqlalchemy.schema import CreateTable
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.dialects.mysql import mysqlconnector
 from sqlalchemy.dialects.mysql.base import MySQLDDLCompiler
+import numpy as np
 import pandas as pd
 from typing import Union
-from faker import Faker
 from dotenv import load_dotenv
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load environment variables from the .env file
-load_dotenv()
+# Desensitization configuration, applied by configure()
+config_data = {}
 
-# Load the desensitization configuration from the JSON file
-with open("config.json") as f:
-    config_data = json.load(f)
-    logger.debug(f'Config Data:\n{config_data}')
+# Table configurations indexed by table name
+tables_config = {}
 
-# Set the output format: "csv" or "sql"
-output_format = config_data.get("output_format", "csv")
+# Output format: "csv" or "sql"
+output_format = "csv"
+
+# Number of rows read from the database at a time
+chunk_size = 5000
+
+# Number of rows grouped into a single INSERT statement in the SQL output
+insert_batch_size = 1000
+
+# Number of rows above which a column is generated across a process pool
+parallel_threshold = 50000
+
+# Fake data backend: "faker" or "mimesis"
+faker_backend = "faker"
+
+# Database engine of the current process
+engine = None
+
+# Number of processes generating large columns in the current process, set per table worker by main()
+generation_workers = 1
 
 class CustomMySQLDDLCompiler(MySQLDDLCompiler):
     def visit_create_table(self, create):
@@ -47,160 +66,432 @@ def _add_if_not_exists(element, compiler, **kwargs):
     return create_statement
 
 
-def generate_create_table_sql(table_name, engine):
-    metadata = MetaData()
-    table = Table(table_name, metadata, autoload_with=engine)
-    
+def generate_create_table_sql(table):
     # Generate CREATE TABLE statement
     create_table_sql = CreateTable(table).compile(dialect=CustomMySQLDialect())
     
     return f"{create_table_sql};\n\n"
 
 
-# Initialize the Faker instance
-fake = Faker()
+# Choices for the enumerated data types
+_STATES = (
+    "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI",
+    "ID", "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI",
+    "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC",
+    "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT",
+    "VT", "VA", "WA", "WV", "WI", "WY")
+_GENDERS = ("M", "F")
+
+# Random number generator of the data types generated with NumPy
+_RNG = np.random.default_rng()
+
+# Data types generated with NumPy by _bulk_generate, which don't need Faker
+_VECTORIZED_TYPES = {"blank", "state", "gender", "float", "check"}
+
+# Faker or Mimesis generators of the other data types, built by configure()
+_GENERATORS = {}
+
+# Faker instance and Mimesis providers, only constructed when a configured column needs them
+fake = None
+_mimesis_providers = ()
+
+# Faker name lists keyed by data type, as (names, probabilities) for generating whole columns at once
+_NAME_CHOICES = {}
 
-# Function to generate fake data based on the data type
-def generate_fake_data(data_type: str) -> Union[str, float, None]:
+
+def _name_choices(elements) -> tuple:
     """
-    Generate fake data based on the given data type using the Faker library.
+    Return the names of a Faker provider list and their probabilities.
 
-    This function generates fake data depending on the input data type. Supported data types
-    include "name", "address", "email", "phone_number", "date", "float", "check", and "gender".
+    Faker stores names either as a plain sequence or as a mapping of name to weight, depending on the locale.
 
     Parameters:
-    data_type (str): The type of fake data to generate. Supported types are "name", "address", "email",
-                     "phone_number", "date", "float", "check", and "gender".
+    elements (Union[tuple, dict]): The provider's name list.
 
     Returns:
-    Union[str, float, None]: The generated fake data as a string or float, or None if the data type is not supported.
-    """
-    if data_type == "company":
-        return fake.company()
-    elif data_type == "first_name":
-        return fake.first_name()
-    elif data_type == "last_name":
-        return fake.last_name()
-    elif data_type == "address":
-        return fake.street_address()
-    elif data_type == "city":
-        return fake.city()
+    tuple: The names as a NumPy array and their probabilities, or None for a uniform choice.
+    """
+    if isinstance(elements, dict):
+        weights = np.array(list(elements.values()), dtype=float)
+        return np.array(list(elements.keys()), dtype=object), weights / weights.sum()
+    return np.array(elements, dtype=object), None
+
+
+def _build_generators(backend: str, data_types: set) -> dict:
+    """
+    Build the fake data generators for the given backend.
+
+    Constructing Faker loads many locale files, so neither Faker nor Mimesis is imported
+    unless one of the configured data types needs them.
+
+    Parameters:
+    backend (str): The fake data backend, "faker" or "mimesis".
+    data_types (set): The data types used by the configured columns.
+
+    Returns:
+    dict: The fake data generators keyed by data type.
+    """
+    global fake, _mimesis_providers, _NAME_CHOICES
+    if data_types <= _VECTORIZED_TYPES:
+        return {}
+
+    if backend == "mimesis":
+        # Mimesis is an optional dependency, only needed when selected in the configuration
+        from mimesis import Person, Address, Finance, Datetime
+
+        person = Person()
+        address = Address()
+        finance = Finance()
+        datetime_provider = Datetime()
+        _mimesis_providers = (person, address, finance, datetime_provider)
+
+        return {
+            "company": finance.company,
+            "first_name": person.first_name,
+            "last_name": person.last_name,
+            "address": address.address,
+            "city": address.city,
+            "country": address.country,
+            "postal_code": address.postal_code,
+            "email": person.email,
+            "phone": person.phone_number,
+            "date": lambda: datetime_provider.date().isoformat(),
+        }
+
+    from faker import Faker
+
+    fake = Faker()
+
+    # Read the name lists straight from the person provider, _bulk_generate draws whole name columns from them
+    person_provider = fake.provider("faker.providers.person")
+    _NAME_CHOICES = {
+        "first_name": _name_choices(person_provider.first_names),
+        "last_name": _name_choices(person_provider.last_names),
+    }
+
+    return {
+        "company": fake.company,
+        "address": fake.street_address,
+        "city": fake.city,
+        "country": fake.country,
+        "postal_code": fake.postcode,
+        "email": fake.email,
+        "phone": fake.phone_number,
+        "date": fake.date,
+    }
+
+
+def configure(config: dict) -> None:
+    """
+    Apply the desensitization configuration to the module settings and build the generators.
+
+    Parameters:
+    config (dict): The desensitization configuration loaded from config.json.
+    """
+    global config_data, tables_config, output_format, chunk_size, insert_batch_size
+    global parallel_threshold, faker_backend, _GENERATORS
+    config_data = config
+    tables_config = {table['name']: table for table in config['tables']}
+    output_format = config.get("output_format", "csv")
+    chunk_size = config.get("chunk_size", 5000)
+    insert_batch_size = config.get("insert_batch_size", 1000)
+    parallel_threshold = config.get("parallel_threshold", 50000)
+    faker_backend = config.get("faker_backend", "faker")
+
+    data_types = {column['type'] for table in config['tables'] for column in table['columns']}
+    _GENERATORS = _build_generators(faker_backend, data_types)
+
+
+# Function to generate a whole column of fake data at once
+def _bulk_generate(data_type: str, n: int) -> Union[list, np.ndarray]:
+    """
+    Generate n fake values of the given data type in a single call.
+
+    Types with trivial output ("blank", "state", "gender", "float", "check") and the Faker name
+    lists ("first_name", "last_name") are produced with NumPy;
+    every other type resolves its generator once and calls it n times in a list comprehension.
+
+    Parameters:
+    data_type (str): The type of fake data to generate. Supported types are "company", "first_name", "last_name",
+                     "address", "city", "state", "country", "postal_code", "email", "phone", "date", "blank",
+                     "float", "check", and "gender".
+    n (int): The number of values to generate.
+
+    Returns:
+    Union[list, np.ndarray]: A sequence of length n with the generated fake data, or None values if the data type is not supported.
+    """
+    if data_type == "blank":
+        return np.full(n, "", dtype=object)
     elif data_type == "state":
-        return fake.random_element(elements=(
-            "AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI",
-            "ID", "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI",
-            "MN", "MS", "MO", "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC",
-            "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "TX", "UT",
-            "VT", "VA", "WA", "WV", "WI", "WY"))
-    elif data_type == "country":
-        return fake.country()
-    elif data_type == "postal_code":
-        return fake.postcode()
-    elif data_type == "email":
-        return fake.email()
-    elif data_type == "phone":
-        return fake.phone_number()
-    elif data_type == "date":
-        return fake.date()
-    elif data_type == "blank":
-        return ""
+        return _RNG.choice(_STATES, size=n)
+    elif data_type == "gender":
+        return _RNG.choice(_GENDERS, size=n)
     elif data_type == "float":
-        return fake.random_number(digits=4, fix_len=True) / 100
+        return _RNG.integers(1000, 10000, n) / 100.0
     elif data_type == "check":
-        return fake.bothify(text='??######', letters='ABCDEFGHIJKLMNOPQRSTUVWXYZ')
-    elif data_type == "gender":
-        return fake.random_element(elements=("M", "F"))
-    else:
-        return None
+        # Build the "??######" check numbers as ASCII codes: two letters followed by six digits
+        codes = np.empty((n, 8), dtype=np.uint8)
+        codes[:, :2] = _RNG.integers(ord("A"), ord("Z") + 1, size=(n, 2))
+        codes[:, 2:] = _RNG.integers(ord("0"), ord("9") + 1, size=(n, 6))
+        return codes.view("S8").ravel().astype(str)
+    elif data_type in _NAME_CHOICES:
+        names, probs = _NAME_CHOICES[data_type]
+        return _RNG.choice(names, size=n, p=probs)
+    elif generation_workers > 1 and n > parallel_threshold:
+        # Split the rows into one partition per worker and stitch the results back together
+        pool = _get_generation_pool()
+        workers = generation_workers
+        sizes = [n // workers + (1 if i < n % workers else 0) for i in range(workers)]
+        parts = pool.starmap(_generate_values, [(data_type, size) for size in sizes])
+        return np.concatenate([np.array(part, dtype=object) for part in parts])
+    return _generate_values(data_type, n)
+
+
+# Function to generate fake data with the generator of the data type
+def _generate_values(data_type: str, n: int) -> list:
+    """
+    Generate n fake values of the given data type, resolving its generator only once.
+
+    Parameters:
+    data_type (str): The type of fake data to generate (see _bulk_generate).
+    n (int): The number of values to generate.
+
+    Returns:
+    list: A list of length n with the generated fake data, or None values if the data type is not supported.
+    """
+    gen = _GENERATORS.get(data_type)
+    if gen is None:
+        return [None] * n
+    return [gen() for _ in range(n)]
+
+
+# Process pool used to generate large columns, created on first use
+_generation_pool = None
+
+
+def _get_generation_pool() -> multiprocessing.pool.Pool:
+    """
+    Return the process pool used to generate large columns, creating it on first use.
+
+    Each worker builds its own generators from the configuration, so only the data type and
+    the partition size are sent to it.
+    """
+    global _generation_pool
+    if _generation_pool is None:
+        _generation_pool = multiprocessing.Pool(processes=generation_workers, initializer=_init_generation_worker, initargs=(config_data,))
+    return _generation_pool
+
+
+# Convert an array of values to strings and quote them for the SQL output
+_quote_sql_values = np.vectorize(lambda value: repr(str(value)), otypes=[object])
 
 
 # Function to desensitize a DataFrame based on the configuration
-def desensitize_data(data: pd.DataFrame, table_name: str, config_data: dict) -> pd.DataFrame:
+def desensitize_data(data: pd.DataFrame, columns: list) -> pd.DataFrame:
     """
-    Desensitize the given DataFrame based on the provided configuration data.
+    Desensitize the given DataFrame based on the resolved column configuration.
 
     This function replaces sensitive information in the input DataFrame with
     fake data generated using the Faker library. The columns to be desensitized
-    and the type of fake data to be generated are determined by the configuration data.
+    and the type of fake data to be generated are resolved once per table by
+    resolve_columns.
 
     Parameters:
     data (pd.DataFrame): The input DataFrame containing the sensitive data to be desensitized.
-    table_name (str): The name of the table in the configuration data that corresponds to the DataFrame.
-    config_data (dict): A dictionary containing the desensitization configuration for each table.
+    columns (list): The (column name, data type) pairs to desensitize, all present in the DataFrame.
 
     Returns:
     pd.DataFrame: A new DataFrame with the sensitive data desensitized according to the configuration.
     """
-    table_config = next((table for table in config_data['tables'] if table['name'] == table_name), None)
-    if table_config:
-        logger.info(f"Process table {table_name}")
-        for column_config in table_config['columns']:
-            column_name = column_config['name']
-            logger.info(f"Desensitize column {column_name}")
-            data_type = column_config['type']
-            if column_name in data:
-                data[column_name] = data[column_name].apply(lambda x: generate_fake_data(data_type))
+    for column_name, data_type in columns:
+        logger.debug("Desensitize column %s", column_name)
+        n = len(data)
+        data[column_name] = _bulk_generate(data_type, n)
     return data
 
 
-# Create a SQLAlchemy connection string
-db_connection_string = f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-
-# Connect to the database using SQLAlchemy
-engine = create_engine(db_connection_string)
-
-# Get the list of tables using the inspect function
-inspector = inspect(engine)
-tables = inspector.get_table_names()
-
-logger.info(f'Verifying {len(tables)} tables...')
-
-# Create a folder named after the database
-db_name = os.getenv("DB_NAME")
-if not os.path.exists(db_name):
-    os.makedirs(db_name)
-
-# Loop through each table and process it
-for table_name in tables:
-    # Read and write the table data in chunks
-    offset = 0
-    chunk_size = 5000
-    while True:
-        # Read a chunk of data from the table
-        logger.debug(f'Read a chunk of data from the table {table_name}...')
-        data = pd.read_sql(f"SELECT * FROM {table_name} LIMIT {chunk_size} OFFSET {offset}", engine)
-
-        # Break the loop if no data is returned
-        if data.empty:
-            logger.debug(f'Break the loop if no data is returned')
-            break
-
-        # Desensitize the data
-        logger.debug(f'Sensitive data:\n{data}')
-        desensitized_data = desensitize_data(data, table_name, config_data)
-        logger.debug(f'Desensitized data:\n{desensitized_data}')
-
-        # Write the desensitized data to a file
-        logger.debug(f'Write the desensitized data to a file')
-        mode = "w" if offset == 0 else "a"
-        file_path = os.path.join(db_name, f"{table_name}_desensitized.{output_format}")
-
-        if output_format == "csv":
-            desensitized_data.to_csv(file_path, mode=mode, index=False, header=(offset == 0))
-        elif output_format == "sql":
-            with open(file_path, mode) as f:
-                if mode == "w":
-                    # Write the CREATE TABLE statement
-                    create_table_sql = generate_create_table_sql(table_name, engine)
-                    f.write(create_table_sql)
-
-                # Write the INSERT statements
-                for index, row in desensitized_data.iterrows():
-                    insert_data = [repr(str(value)) if value is not None and not (isinstance(value, float) and math.isnan(value)) else "NULL" for value in row]
-                    insert_data_str = ",".join(insert_data)
-                    f.write(f"INSERT INTO {table_name} VALUES ({insert_data_str});\n")
-
-        # Increase the offset
-        offset += chunk_size
-
-logger.info('Desensitization completed.')
+# Function to resolve the configured columns of a table
+def resolve_columns(table_name: str, table_columns: pd.Index) -> list:
+    """
+    Resolve the configured columns to desensitize that are present in the table.
+
+    Parameters:
+    table_name (str): The name of the table in the configuration data.
+    table_columns (pd.Index): The columns read from the table.
+
+    Returns:
+    list: The (column name, data type) pairs to desensitize, empty if the table is not configured.
+    """
+    table_config = tables_config.get(table_name)
+    if not table_config:
+        return []
+    logger.info(f"Process table {table_name}")
+    return [(column_config['name'], column_config['type'])
+            for column_config in table_config['columns']
+            if column_config['name'] in table_columns]
+
+
+def create_db_engine():
+    """Connect to the database set in the environment variables using SQLAlchemy."""
+    # Create a SQLAlchemy connection string, using PyMySQL whose dialect supports the server-side
+    # cursors needed to stream the tables (mysqlconnector's always buffers the whole result)
+    db_connection_string = f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+
+    return create_engine(db_connection_string)
+
+
+def _init_generation_worker(config: dict):
+    """
+    Prepare a worker process for fake data generation.
+
+    Spawned workers don't inherit the configuration applied in main(), so it is applied again.
+    Forked workers inherit the parent's random state, so every generator is reseeded to keep
+    the workers from producing identical fake data.
+    """
+    configure(config)
+    _reseed()
+
+
+def _init_worker(config: dict, workers: int):
+    """
+    Prepare a worker process for table processing.
+
+    On top of the generation setup, each worker opens its own database engine since
+    SQLAlchemy engines are not fork-safe.
+
+    Parameters:
+    config (dict): The desensitization configuration loaded from config.json.
+    workers (int): The number of processes the worker may use to generate large columns.
+    """
+    global engine, generation_workers
+    _init_generation_worker(config)
+    engine = create_db_engine()
+    generation_workers = workers
+
+
+def _reseed():
+    """Reseed every fake data generator of the current process."""
+    global _RNG
+    _RNG = np.random.default_rng()
+    if fake is not None:
+        fake.seed_instance()
+    for provider in _mimesis_providers:
+        provider.reseed()
+
+
+def process_table(table_name: str, create_table_sql: Union[str, None] = None) -> None:
+    """
+    Desensitize a single table and write it to its output file.
+
+    Parameters:
+    table_name (str): The name of the table to read, desensitize and write.
+    create_table_sql (Union[str, None]): The precompiled CREATE TABLE statement of the table, written first in the SQL output.
+    """
+    # Output files are written to a folder named after the database
+    file_path = os.path.join(os.getenv("DB_NAME"), f"{table_name}_desensitized.{output_format}")
+
+    # Keep a single buffered handle open for the whole table
+    with open(file_path, "w", newline="", buffering=1 << 20) as f:
+        if output_format == "sql":
+            # Write the CREATE TABLE statement
+            f.write(create_table_sql)
+
+        # Read and write the table data in chunks, streaming them through a server-side cursor
+        # (PyMySQL's SSCursor) so each row is fetched only once instead of re-scanning the table
+        # for every chunk, and only the current chunk is held in memory
+        logger.debug(f'Read the data from the table {table_name} in chunks...')
+        chunks = pd.read_sql(f"SELECT * FROM {table_name}", engine.execution_options(stream_results=True), chunksize=chunk_size)
+        for chunk_index, data in enumerate(chunks):
+            # Break the loop if no data is returned
+            if data.empty:
+                logger.debug('Break the loop if no data is returned')
+                if chunk_index == 0 and output_format == "csv":
+                    # Write the header of an empty table rather than leaving an empty file
+                    data.to_csv(f, index=False)
+                break
+
+            # Resolve the columns to desensitize from the first chunk
+            if chunk_index == 0:
+                columns = resolve_columns(table_name, data.columns)
+
+            # Desensitize the data
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Sensitive data:\n%s", data)
+            desensitized_data = desensitize_data(data, columns)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Desensitized data:\n%s", desensitized_data)
+
+            # Write the desensitized data to a file
+            logger.debug('Write the desensitized data to a file')
+            if output_format == "csv":
+                desensitized_data.to_csv(f, index=False, header=(chunk_index == 0))
+            elif output_format == "sql":
+                # Build the INSERT statements from the values converted with str() and quoted cell by cell
+                # in one pass (a pandas string cast would decode bytes from binary columns as UTF-8),
+                # then replaced by NULL through a mask computed once per chunk
+                null_mask = desensitized_data.isna().to_numpy()
+                values = _quote_sql_values(desensitized_data.to_numpy(dtype=object))
+                values[null_mask] = "NULL"
+                rows = [f"({','.join(row)})" for row in values.tolist()]
+
+                # Group the rows into multi-row INSERT statements
+                lines = [f"INSERT INTO {table_name} VALUES {','.join(rows[i:i + insert_batch_size])};\n"
+                         for i in range(0, len(rows), insert_batch_size)]
+                f.write("".join(lines))
+
+            # The streamed read only holds the current chunk, so release it before the next one is
+            # fetched to keep a single chunk in memory, and collect any leftover reference cycles
+            del data, desensitized_data
+            if chunk_index % 10 == 9:
+                gc.collect()
+
+
+def main():
+    # Load environment variables from the .env file
+    load_dotenv()
+
+    # Load the desensitization configuration from the JSON file
+    with open("config.json") as f:
+        config = json.load(f)
+        logger.debug("Config Data:\n%s", config)
+    configure(config)
+
+    # Connect to the database using SQLAlchemy
+    engine = create_db_engine()
+
+    create_table_sql_by_name = {}
+    if output_format == "sql":
+        # Reflect all the tables at once, which also gives the list of tables, and compile
+        # their CREATE TABLE statements up front. Tables of other schemas referenced by foreign
+        # keys are reflected too, under a "schema.table" key, and are left out
+        metadata = MetaData()
+        metadata.reflect(bind=engine)
+        tables = [name for name, table in metadata.tables.items() if table.schema is None]
+        create_table_sql_by_name = {name: generate_create_table_sql(metadata.tables[name]) for name in tables}
+    else:
+        # Only the table names are needed, get them using the inspect function
+        inspector = inspect(engine)
+        tables = inspector.get_table_names()
+
+    # Close the pooled connections so the worker processes don't inherit them
+    engine.dispose()
+
+    logger.info(f'Verifying {len(tables)} tables...')
+
+    # Create a folder named after the database
+    db_name = os.getenv("DB_NAME")
+    if not os.path.exists(db_name):
+        os.makedirs(db_name)
+
+    # Process the tables concurrently, each one is written to its own file, and share the
+    # remaining CPU cores between the table workers to generate large columns
+    table_workers = max(1, min(os.cpu_count(), len(tables)))
+    workers = os.cpu_count() // table_workers
+    with ProcessPoolExecutor(max_workers=table_workers, initializer=_init_worker, initargs=(config, workers)) as executor:
+        list(executor.map(process_table, tables, [create_table_sql_by_name.get(name) for name in tables]))
+
+    logger.info('Desensitization completed.')
+
+
+if __name__ == "__main__":
+    main()